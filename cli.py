@@ -3,16 +3,27 @@ import json
 import sys
 import traceback
 import time
+from functools import lru_cache, partial
 import pandas as pd
 
 # Import modern processors
-from processor import process_file as process_physical
-from processor_no_weight import process_file as process_digital
+from processor import process_file
+
+process_physical = process_file
+process_digital = partial(process_file, digital=True)
+
+# Import mode -> processor, resolved once at import time
+PROCESSORS = {'1': process_physical, '2': process_digital}
+
+@lru_cache(maxsize=1)
+def _read_formulas():
+    with open('formulas.json', 'r') as f:
+        return json.load(f)
 
 def load_formulas():
+    # formulas.json is parsed once per process; callers get their own copy to add CLI answers to
     try:
-        with open('formulas.json', 'r') as f:
-            return json.load(f)
+        return dict(_read_formulas())
     except Exception as e:
         print(f"Error reading formulas.json: {e}")
         sys.exit(1)
@@ -27,13 +38,17 @@ def main():
     print(" 2. Digital products (no weight/shipping)")
     while True:
         mode_input = input("Enter 1 for physical or 2 for digital: ").strip()
-        if mode_input in ['1', '2']:
+        if mode_input in PROCESSORS:
             break
         print("Invalid selection. Please enter 1 or 2.")
     is_physical = (mode_input == '1')
 
     # 2. Select input file
-    files = [f for f in os.listdir('.') if f.lower().endswith(('.csv', '.xls', '.xlsx')) and not f.startswith('~$')]
+    with os.scandir('.') as entries:
+        files = [
+            e.name for e in entries
+            if e.is_file() and e.name.lower().endswith(('.csv', '.xls', '.xlsx')) and not e.name.startswith('~$')
+        ]
     if not files:
         print("No CSV/XLSX files found in current directory.")
         sys.exit(1)
@@ -91,10 +106,7 @@ def main():
     # 7. Process file
     print(f"\nProcessing file with {'physical' if is_physical else 'digital'} product logic...")
     try:
-        if is_physical:
-            out_file = process_physical(in_file, config, export_mode)
-        else:
-            out_file = process_digital(in_file, config, export_mode)
+        out_file = PROCESSORS[mode_input](in_file, config, export_mode)
         print(f"\n✅ Export complete: {out_file}\n")
     except Exception as e:
         print("\n❌ Error during processing!")
@@ -1,8 +1,11 @@
 import ast
+import math
+from collections import deque
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 
-SHOPIFY_HEADERS = {
+SHOPIFY_HEADERS = frozenset({
     'Handle', 'Title', 'Body (HTML)', 'Vendor', 'Type', 'Tags', 'Published',
     'Option1 Name', 'Option1 Value', 'Option2 Name', 'Option2 Value', 'Option3 Name', 'Option3 Value',
     'Variant SKU', 'Variant Grams', 'Variant Inventory Tracker', 'Variant Inventory Qty',
@@ -15,58 +18,195 @@ SHOPIFY_HEADERS = {
     'Google Shopping / Custom Label 1', 'Google Shopping / Custom Label 2', 'Google Shopping / Custom Label 3',
     'Google Shopping / Custom Label 4', 'Variant Image', 'Variant Weight Unit', 'Variant Tax Code',
     'Cost per item', 'Price / International', 'Compare At Price / International', 'Status'
-}
+})
+_DEFAULT_EXCLUDES = SHOPIFY_HEADERS | {None}
+
+# Exact node types, checked with one hash lookup each; numbers parse as ast.Constant (ast.Num is a
+# deprecated alias that never appears in a tree)
+_ALLOWED_AST_NODES = frozenset({
+    ast.Expression, ast.BinOp, ast.Name, ast.Load, ast.UnaryOp,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub,
+    ast.Call, ast.FormattedValue, ast.JoinedStr, ast.Constant
+})
+
+@lru_cache(maxsize=128)
+def compile_expression(expr: str):
+    # Parse, validate and compile once per formula string; rows only pay for eval(). processor.py
+    # evaluates its formulas through this same allowlist.
+    tree = ast.parse(expr, mode='eval')
+    # Breadth-first like ast.walk, stopping at the first blocked node
+    pending = deque([tree])
+    while pending:
+        node = pending.popleft()
+        if type(node) not in _ALLOWED_AST_NODES:
+            raise ValueError(f"Unsafe expression: {expr} [blocked {type(node).__name__}]")
+        pending.extend(ast.iter_child_nodes(node))
+    return compile(tree, '<string>', 'eval')
 
 def safe_eval(expr: str, context: dict) -> str:
-    allowed_nodes = (
-        ast.Expression, ast.BinOp, ast.Num, ast.Name, ast.Load, ast.UnaryOp,
-        ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub,
-        ast.Call, ast.FormattedValue, ast.JoinedStr, ast.Constant
-    )
     try:
-        tree = ast.parse(expr, mode='eval')
-        for node in ast.walk(tree):
-            if not isinstance(node, allowed_nodes):
-                raise ValueError(f"Unsafe expression: {expr} [blocked {type(node).__name__}]")
-        return eval(compile(tree, '<string>', 'eval'), {}, context)
+        return eval(compile_expression(expr), {}, context)
     except Exception as e:
         return f"[Description Error: {e} in: {expr}]"
 
-def generate_description(row: dict, seo_formula: str, config=None) -> str:
-    if not config or 'description_include_columns' not in config:
-        raise Exception("Missing 'description_include_columns' in config!")
-    includes = config['description_include_columns']
-    excludes = set(config.get('description_exclude_columns', [])) if config else set()
-    excludes |= SHOPIFY_HEADERS | {None}
-
-    desc = "<p>"
-    for col in includes:
-        val = row.get(col, None)
-        if (
-            col not in excludes
-            and isinstance(val, (str, float, int, bool, np.generic))
-            and pd.notna(val)
-            and str(val).strip()
-        ):
-            label = col.replace('_', ' ')
-            desc += f"<strong>{label}: </strong> {val}<br>"
-    desc += "</p>"
-
-    # Only add shipping note if weight > 150
-    weight = row.get('Weight', row.get('Weight lbs', 0))
+def _formula_names(expr):
+    # Names the compiled formula can read; None when it does not compile (safe_eval reports that)
     try:
-        w = float(str(weight).replace(',', ''))
+        return compile_expression(expr).co_names
+    except Exception:
+        return None
+
+def _value_tag(value):
+    # Equal values can render differently: the type keeps 1, 1.0 and True apart, the sign 0.0 and -0.0
+    if isinstance(value, (float, np.floating)):
+        return type(value), math.copysign(1.0, value)
+    return type(value)
+
+@lru_cache(maxsize=4096)
+def _render_seo(seo_formula, values):
+    # values: (name, _value_tag(value), value) for exactly the names the formula reads
+    return safe_eval(seo_formula, {name: value for name, _, value in values}).strip()
+
+_SHIPPING_NOTE = '<p><em>NOTE: We will contact you during order fulfilment to discuss shipping and handling costs for products weighing more than 150 pounds. These costs will be billed separately.</em></p>'
+_MANUFACTURER_LINK = '<p><a href="https://wilo.com/en/overview.html" target="_blank">View Manufacturer Website</a></p>'
+# Everything after the spec list is static; join both variants once at import
+_CLOSING_HTML = "</p>" + _MANUFACTURER_LINK
+_CLOSING_HTML_WITH_NOTE = "</p>" + _SHIPPING_NOTE + _MANUFACTURER_LINK
+_SCALAR_TYPES = (str, float, int, bool, np.generic)
+_SHIPPING_NOTE_THRESHOLD = 150.0
+
+@lru_cache(maxsize=256)
+def _label_html(col):
+    return f"<strong>{col.replace('_', ' ')}: </strong> "
+
+def _nonempty(val):
+    # Scalar value worth printing; NaN/NaT fail the self-equality test without a pandas call.
+    return isinstance(val, _SCALAR_TYPES) and val == val and str(val).strip() != ""
+
+def parse_number(text, default=0.0):
+    """float() of a cell's text, or default where float() rejects it; the one parser for prices and weights."""
+    try:
+        return float(text)
     except (ValueError, TypeError):
-        w = 0
-    if w > 150 or w < 1:
-        desc += '<p><em>NOTE: We will contact you during order fulfilment to discuss shipping and handling costs for products weighing more than 150 pounds. These costs will be billed separately.</em></p>'
+        return default
+
+def parse_weight(value):
+    # Weights may carry thousands separators ('1,200'); used per row and, via Series.map, per column
+    return parse_number(str(value).replace(',', ''))
+
+def _weight_needs_note(weight, threshold=_SHIPPING_NOTE_THRESHOLD):
+    # Works on a parsed float or a float Series/array alike; NaN never triggers the note.
+    return (weight > threshold) | (weight < 1)
+
+def column_text(values: pd.Series) -> pd.Series:
+    """
+    values.astype(str) without touching values. On pandas 1.5, astype(str) on a column of a frame
+    loaded from pickle (the source cache) writes the strings back, turning empty cells into 'nan'.
+    """
+    return values.copy().astype(str)
 
-    desc += '<p><a href="https://wilo.com/en/overview.html" target="_blank">View Manufacturer Website</a></p>'
+def plan_description_columns(df_columns, config) -> tuple:
+    """
+    Resolve once per DataFrame which included columns can appear in a description:
+    present in the columns (or config) and not excluded, in config order.
+    """
+    if not config or 'description_include_columns' not in config:
+        raise Exception("Missing 'description_include_columns' in config!")
+    excludes = _DEFAULT_EXCLUDES | frozenset(config.get('description_exclude_columns', ()))
+    available = set(df_columns) | set(config)
+    return tuple(
+        col for col in config['description_include_columns']
+        if col in available and col not in excludes
+    )
+
+def build_description_bodies(df: pd.DataFrame, config=None) -> pd.Series:
+    """
+    Vectorized counterpart of the HTML built by generate_description, one body per row of df.
+    Only sheet columns and config values are visible here (config wins on a name clash); values
+    a caller adds to each row's context afterwards are not, so such columns need the per-row path.
+    """
+    include_cols = plan_description_columns(df.columns, config)
+
+    body = pd.Series("<p>", index=df.index, dtype=object)
+    for col in include_cols:
+        if col in config:
+            val = config[col]
+            if _nonempty(val):
+                body = body + f"{_label_html(col)}{val}<br>"
+            continue
+        values = df[col]
+        if values.dtype == object:
+            mask = values.map(lambda v: isinstance(v, _SCALAR_TYPES))
+        elif pd.api.types.is_datetime64_any_dtype(values) or pd.api.types.is_timedelta64_dtype(values):
+            continue
+        else:
+            mask = pd.Series(True, index=df.index)
+        text = column_text(values)
+        mask &= values.notna() & (text.str.strip() != '')
+        body = body + (_label_html(col) + text + "<br>").where(mask, "")
+
+    # Only add shipping note if weight > 150 (or missing/unparseable); parse the column once
+    weight_col = 'Weight' if 'Weight' in df.columns else 'Weight lbs' if 'Weight lbs' in df.columns else None
+    if weight_col is None:
+        weights = pd.Series(0.0, index=df.index)
+    else:
+        weights = df[weight_col].map(parse_weight).astype(float)
+    return body + np.where(_weight_needs_note(weights), _CLOSING_HTML_WITH_NOTE, _CLOSING_HTML)
+
+_KEY_TABLE = str.maketrans(' ', '_')
+
+def formula_context_keys(keys) -> tuple:
+    """
+    Formula-friendly alias for each key, in order ('Weight lbs' -> 'weight_lbs').
+    Rows of one frame share their keys, so compute this once and pass it as context_keys.
+    """
+    return tuple(k.translate(_KEY_TABLE).lower() if isinstance(k, str) else k for k in keys)
 
-    context = {k.replace(' ', '_').lower(): v for k, v in row.items() if isinstance(k, str)}
+def generate_description(row: dict, seo_formula: str, config=None, body=None, include_cols=None,
+                         context_keys=None) -> str:
+    """
+    Render the description for one row and pass it through the SEO formula.
+    A precomputed body (see build_description_bodies) skips the per-row HTML build;
+    callers looping over a frame can pass include_cols from plan_description_columns
+    and context_keys from formula_context_keys.
+    """
+    if not config or 'description_include_columns' not in config:
+        raise Exception("Missing 'description_include_columns' in config!")
+
+    if body is not None:
+        desc = body
+    else:
+        if include_cols is None:
+            include_cols = plan_description_columns(row.keys(), config)
+
+        parts = ["<p>"]
+        for col in include_cols:
+            val = row.get(col, None)
+            if _nonempty(val):
+                parts.append(f"{_label_html(col)}{val}<br>")
+
+        # Only add shipping note if weight > 150
+        weight = parse_weight(row.get('Weight', row.get('Weight lbs', 0)))
+        parts.append(_CLOSING_HTML_WITH_NOTE if _weight_needs_note(weight) else _CLOSING_HTML)
+        desc = "".join(parts)
+
+    if context_keys is None or len(context_keys) != len(row):
+        context_keys = formula_context_keys(row.keys())
+    context = dict(zip(context_keys, row.values()))
     context.update(row)
     if config:
-        context.update({k: v for k, v in config.items()})
+        context.update(config)
     context['description'] = desc
 
+    # Variants often share every value the formula reads; reuse the rendered text for those
+    names = _formula_names(seo_formula)
+    if names is not None:
+        key = tuple((name, _value_tag(context[name]), context[name]) for name in names if name in context)
+        try:
+            hash(key)
+        except TypeError:
+            pass
+        else:
+            return _render_seo(seo_formula, key)
+
     return safe_eval(seo_formula, context).strip()
\ No newline at end of file
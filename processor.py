@@ -1,12 +1,32 @@
 import os
 import re
+import hashlib
+import importlib.util
+import ast
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from fuzzywuzzy import fuzz
-from description import generate_description
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+from description import (
+    build_description_bodies, column_text, compile_expression, formula_context_keys, generate_description,
+    parse_number, parse_weight, plan_description_columns
+)
 
 SUPPORTED_EXT = ['.csv', '.xls', '.xlsx']
+# Parsed Excel sheets, reused while the source file is unchanged (see read_source). Lives in the
+# user's own cache directory, never next to the data, since entries are unpickled on load.
+SOURCE_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'shopify_import', 'sources'
+)
+
+# Keys process_file adds to each row's formula context on top of the sheet columns and config
+_ROW_CONTEXT_KEYS = frozenset({'model', 'title', 'price', 'grams', 'cost', 'voltage', 'description'})
+
+# Cell values suppliers use for "no value" in SKU, price and option columns
+_PLACEHOLDERS = frozenset({'', 'CF', 'N/A', '—', '-'})
 
 SHOPIFY_HEADERS = [
     'Handle', 'Title', 'Body (HTML)', 'Vendor', 'Type', 'Tags', 'Published',
@@ -23,17 +43,60 @@ SHOPIFY_HEADERS = [
     'Cost per item', 'Price / International', 'Compare At Price / International', 'Status'
 ]
 
+# Output columns that change from variant to variant, in the order process_file records them
+ROW_COLUMNS = (
+    'Handle', 'Title', 'Body (HTML)',
+    'Option1 Name', 'Option1 Value', 'Option2 Name', 'Option2 Value', 'Option3 Name', 'Option3 Value',
+    'Variant SKU', 'Variant Grams', 'Variant Price', 'Variant Compare At Price', 'Variant Requires Shipping',
+    'Image Src', 'Image Position', 'Image Alt Text', 'SEO Title', 'SEO Description',
+    'Cost per item', 'Variant Image', 'Tags'
+)
+
+def static_columns(config):
+    """Output columns that hold the same value on every row; pandas broadcasts them."""
+    return {
+        'Vendor': config['vendor'],
+        'Type': config['product_type'],
+        'Published': 'FALSE',
+        'Variant Inventory Tracker': '',
+        'Variant Inventory Qty': '',
+        'Variant Inventory Policy': 'continue',
+        'Variant Fulfillment Service': 'manual',
+        'Variant Taxable': 'TRUE',
+        'Variant Barcode': '',
+        'Product Category': config.get('product_category', ''),
+        'Google Shopping / Gender': '',
+        'Google Shopping / Age Group': '',
+        'Google Shopping / AdWords Grouping': '',
+        'Google Shopping / AdWords Labels': '',
+        'Google Shopping / Custom Label 0': '',
+        'Google Shopping / Custom Label 1': '',
+        'Google Shopping / Custom Label 2': '',
+        'Google Shopping / Custom Label 3': '',
+        'Google Shopping / Custom Label 4': '',
+        'Variant Weight Unit': 'lb',
+        'Variant Tax Code': '',
+        'Price / International': '',
+        'Compare At Price / International': '',
+        'Status': 'draft'
+    }
+
 def fuzzy_match_columns(df, config):
     """
     Map only the columns listed in config['required_columns'] and config['variant_option_fields'] (if any).
     """
-    from fuzzywuzzy import fuzz
-    FUZZY_THRESHOLD = 70
-
     # What do we need for this batch?
     required = config.get("required_columns", [])
     variant_fields = config.get("variant_option_fields", [])
-    fields_needed = list(set(required + variant_fields))
+    fields_needed = tuple(sorted(set(required + variant_fields)))
+
+    return dict(_match_columns(tuple(df.columns), fields_needed))
+
+
+@lru_cache(maxsize=64)
+def _match_columns(columns, fields_needed):
+    """(field, column) pairs for one header shape; sheets from the same supplier reuse the result."""
+    FUZZY_THRESHOLD = 70
 
     # Optionally, you can update DEFAULT_MAP to include aliases only for these fields
     DEFAULT_ALIASES = {
@@ -46,27 +109,62 @@ def fuzzy_match_columns(df, config):
         # ... add any other field-specific aliases
     }
 
-    mapping = {}
+    # Normalize (lowercase, punctuation -> space) the headers once, as fuzzywuzzy did per comparison
+    choices = [default_process(col) for col in columns]
+    # Headers that spell the alias verbatim (up to case/punctuation) need no scoring; first one wins
+    exact = {}
+    for choice, col in zip(choices, columns):
+        exact.setdefault(choice, col)
+
+    # Score every alias that has no verbatim header against all headers in one batch
+    cutoff = FUZZY_THRESHOLD - 0.5  # fuzzywuzzy rounded scores to int before comparing
+    aliases = {field: [default_process(alias) for alias in DEFAULT_ALIASES.get(field, [field])] for field in fields_needed}
+    pending = list({key: None for keys in aliases.values() for key in keys if key not in exact})
+    scores = {}
+    if pending and choices:
+        matrix = process.cdist(pending, choices, scorer=fuzz.token_set_ratio, processor=None, score_cutoff=cutoff)
+        scores = dict(zip(pending, matrix))
+
+    mapping = []
     for field in fields_needed:
-        aliases = DEFAULT_ALIASES.get(field, [field])
-        found = False
-        for alias in aliases:
-            for col in df.columns:
-                score = fuzz.token_set_ratio(col.lower(), alias.lower())
-                if score >= FUZZY_THRESHOLD:
-                    mapping[field] = col
-                    found = True
-                    break
-            if found:
+        for key in aliases[field]:
+            if key in exact:
+                mapping.append((field, exact[key]))
+                break
+            # Best-scoring header wins (first one on ties), as with process.extractOne
+            row = scores.get(key)
+            if row is not None and row.max() >= cutoff:
+                mapping.append((field, columns[int(row.argmax())]))
                 break
-        if not found:
+        else:
             raise Exception(f"Missing required column: {field}")
-    return mapping
+    return tuple(mapping)
+
+def models_with_varying_option(df, col_model, field):
+    """
+    Models whose `field` holds more than one distinct usable value across their rows.
+    Vectorized over the whole sheet so the check runs once per file, not once per row.
+    """
+    vals = column_text(df[field]).str.upper()
+    usable = df[field].notna() & ~vals.isin(_PLACEHOLDERS)
+    counts = vals[usable].groupby(df.loc[usable, col_model]).nunique()
+    return set(counts.index[counts > 1])
 
-def clean_option(val):
-    return (pd.isnull(val) or str(val).strip().upper() in ("", "CF", "N/A", "—", "-"))
+def clean_option_values(df, fields):
+    """
+    Per option field, {row label: value} with missing and placeholder values blanked to ''.
+    One column pass per field instead of an isnull/strip/upper check on every row.
+    """
+    cleaned = {}
+    for field in fields:
+        values = df[field]
+        blank = values.isna() | column_text(values).str.strip().str.upper().isin(_PLACEHOLDERS)
+        cleaned[field] = values.where(~blank, '').to_dict()
+    return cleaned
 
 
+_SKU_TABLE = str.maketrans('', '', ' ()&/-')
+
 def generate_shopify_sku(row, config, option_fields_key="variant_option_fields"):
     """
     Build a globally unique SKU from product type, model, and all option values.
@@ -82,7 +180,7 @@ def generate_shopify_sku(row, config, option_fields_key="variant_option_fields")
     """
     def clean(val):
         # Remove spaces, brackets, slashes, dashes, and make uppercase
-        return str(val).replace(' ', '').replace('(', '').replace(')', '').replace('&', '').replace('/', '').replace('-', '').upper()
+        return str(val).translate(_SKU_TABLE).upper()
 
     sku_parts = []
 
@@ -100,7 +198,7 @@ def generate_shopify_sku(row, config, option_fields_key="variant_option_fields")
     option_fields = config.get(option_fields_key, [])
     for field in option_fields:
         val = row.get(field, "")
-        if pd.notnull(val) and str(val).strip().upper() not in ("", "CF", "N/A", "—", "-"):
+        if pd.notnull(val) and str(val).strip().upper() not in _PLACEHOLDERS:
             sku_parts.append(clean(val))
 
     # 4. Join for final SKU
@@ -108,31 +206,181 @@ def generate_shopify_sku(row, config, option_fields_key="variant_option_fields")
 
 
 def safe_eval(expr, context):
-    import ast
     try:
-        tree = ast.parse(expr, mode='eval')
-        allowed = (
-            ast.Expression, ast.BinOp, ast.Num, ast.Name, ast.Load, ast.UnaryOp,
-            ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub,
-            ast.Call, ast.FormattedValue, ast.JoinedStr, ast.Constant
-        )
-        for node in ast.walk(tree):
-            if not isinstance(node, allowed):
-                raise ValueError(f"Unsafe expression: {expr} [blocked {type(node).__name__}]")
-        return eval(compile(tree, "<string>", "eval"), {}, context)
+        return eval(compile_expression(expr), {}, context)
     except Exception as e:
         raise ValueError(f"Invalid formula: {e}")
 
+def _is_passthrough(expr, name):
+    """True when the formula just renders one string variable: `name`, f'{name}' or f"{name}"."""
+    try:
+        node = ast.parse(expr, mode='eval').body
+    except (SyntaxError, TypeError, ValueError):
+        return False
+    if isinstance(node, ast.JoinedStr) and len(node.values) == 1:
+        value = node.values[0]
+        if not isinstance(value, ast.FormattedValue) or value.conversion != -1 or value.format_spec:
+            return False
+        node = value.value
+    return isinstance(node, ast.Name) and node.id == name
+
+_VECTOR_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load, ast.Constant, ast.Call,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub
+)
+
+def _round_values(value, ndigits=None):
+    # np.round is not correctly rounded (0.285 -> 0.29); keep Python's round per element so
+    # vectorized prices match the row-wise result to the cent.
+    if np.ndim(value) == 0:
+        return round(value, ndigits)
+    if ndigits is None:
+        # round(x) is half-to-even on the double itself, which np.rint does exactly; ints like round()
+        return np.rint(value).astype(np.int64)
+    return np.array([round(v, ndigits) for v in value.tolist()])
+
+def _is_vectorizable(tree, var_names):
+    for node in ast.walk(tree):
+        if not isinstance(node, _VECTOR_NODES):
+            return False
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            return False
+        if isinstance(node, ast.Name) and node.id not in var_names and node.id != 'round':
+            return False
+        if isinstance(node, ast.Call) and (
+            not isinstance(node.func, ast.Name) or node.func.id != 'round'
+            or node.keywords or not 1 <= len(node.args) <= 2
+        ):
+            return False
+    return True
+
+@lru_cache(maxsize=64)
+def compile_formula(expr, var_names):
+    """
+    Compile a numeric formula (e.g. pricing_formula) once into a callable over whole columns.
+
+    Args:
+        expr (str): Formula string from formulas.json.
+        var_names (tuple): Variables the formula may reference, e.g. ('list_price',).
+
+    Returns:
+        callable: Takes a DataFrame holding one column per variable and returns a Series.
+        Arithmetic-plus-round() formulas run as a single NumPy pass; anything else falls
+        back to safe_eval row by row.
+    """
+    try:
+        tree = ast.parse(expr, mode='eval')
+    except (SyntaxError, TypeError):
+        tree = None  # let the row-wise path raise the usual "Invalid formula" error
+
+    def apply_rowwise(frame):
+        columns = [frame[name].tolist() for name in var_names]
+        return pd.Series(
+            [safe_eval(expr, dict(zip(var_names, values))) for values in zip(*columns)],
+            index=frame.index, dtype=object
+        )
+
+    if tree is None or not _is_vectorizable(tree, var_names):
+        return apply_rowwise
+    code = compile(tree, '<formula>', 'eval')
+
+    def apply(frame):
+        local = {name: frame[name].to_numpy(dtype=float) for name in var_names}
+        try:
+            with np.errstate(divide='raise', invalid='raise', over='raise'):
+                result = eval(code, {'__builtins__': {}, 'round': _round_values}, local)
+        except Exception:
+            # e.g. division by zero: the row-wise path reproduces the scalar behaviour
+            return apply_rowwise(frame)
+        if np.ndim(result) == 0:
+            return pd.Series([result] * len(frame), index=frame.index)
+        return pd.Series(result, index=frame.index)
+
+    return apply
+
+_HANDLE_TABLE = str.maketrans({' ': '-', '/': '-', '(': None, ')': None})
+
 def sanitize_handle(name):
-    return name.strip().lower().replace(' ', '-').replace('/', '-').replace('(', '').replace(')', '')
+    return name.strip().lower().translate(_HANDLE_TABLE)
+
+
+@lru_cache(maxsize=1)
+def _excel_engine():
+    """'calamine' when python-calamine is installed and pandas (2.2+) can use it, else pandas' default."""
+    pandas_version = tuple(int(part) for part in re.findall(r'\d+', pd.__version__)[:2])
+    if pandas_version >= (2, 2) and importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    return None
+
 
+def read_source(filepath, ext):
+    """
+    Load a supplier sheet: python-calamine for Excel when installed (pandas' default engine
+    otherwise), pandas' C engine for CSV.
+    Parsed Excel sheets are cached per path under SOURCE_CACHE_DIR, so re-running an unchanged file
+    is a pickle load.
+    """
+    if ext == '.csv':
+        # Not engine='pyarrow': it turns date-like text into datetime.date objects, which the
+        # description builder skips, and infers other types differently from the C engine
+        return pd.read_csv(filepath)
+
+    # One entry per source path, stamped with mtime, size, pandas version and reader engine: an
+    # edited or replaced sheet (or a newly installed reader) is parsed again and its entry
+    # overwritten, so stale copies never pile up
+    engine = _excel_engine()
+    stat = os.stat(filepath)
+    stamp = (stat.st_mtime_ns, stat.st_size, pd.__version__, engine or 'default')
+    cache_path = os.path.join(SOURCE_CACHE_DIR, hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest() + '.pkl')
+    if os.path.exists(cache_path):
+        try:
+            cached_stamp, cached = pd.read_pickle(cache_path)
+            if cached_stamp == stamp:
+                return cached
+        except Exception:
+            pass  # unreadable cache entry; parse the sheet again and overwrite it
+
+    df = pd.read_excel(filepath, engine=engine)
+    try:
+        os.makedirs(SOURCE_CACHE_DIR, mode=0o700, exist_ok=True)
+        # Write then rename, so a concurrent run never loads a half-written entry
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        pd.to_pickle((stamp, df), tmp_path)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # no writable cache directory: just skip caching
+    return df
+
+
+def parse_list_prices(prices):
+    """
+    Stripped text and numeric value of a list-price column, parsed once. Each value goes through
+    parse_number as str(cell).strip(): a price that float() rejects is 0, while 'nan' (including
+    empty cells) parses to NaN.
+    """
+    price_raw = column_text(prices).str.strip()
+    return price_raw, prices.map(lambda value: parse_number(str(value).strip())).astype(float)
 
-def process_file(filepath, config, mode):
+
+def valid_row_mask(part_numbers, price_raw, list_price):
+    """
+    Rows with a real part number and a non-zero list price, as the old per-row check kept them:
+    NaN prices pass, prices that parsed to 0 do not. price_raw and list_price come from parse_list_prices.
+    """
+    part_number = column_text(part_numbers).str.strip()
+    return ~part_number.isin(_PLACEHOLDERS) & ~price_raw.isin(_PLACEHOLDERS) & list_price.ne(0)
+
+
+def process_file(filepath, config, mode, digital=False):
+    """
+    Convert a supplier sheet into a Shopify import CSV and return its path.
+    digital=True exports weightless products: weight and grams are 0 and shipping is never required.
+    """
     ext = os.path.splitext(filepath)[1].lower()
     if ext not in SUPPORTED_EXT:
         raise Exception("Unsupported file format.")
 
-    df = pd.read_excel(filepath) if ext in ['.xls', '.xlsx'] else pd.read_csv(filepath)
+    df = read_source(filepath, ext)
     df.columns = [re.sub(r'\s+', ' ', col).strip() for col in df.columns]
 
     if len(df) > 1500:
@@ -150,194 +398,164 @@ def process_file(filepath, config, mode):
     col_price = column_map['List Price']
     col_sku = column_map['Article Number']
 
-    rows = []
+    # HTML bodies for every row in one vectorized pass; only the SEO formula runs per row.
+    # Values derived per row below (model, price, ...) are not in df, so descriptions that
+    # include them are rendered from the full row_context instead.
+    if set(config.get('description_include_columns', ())) & _ROW_CONTEXT_KEYS:
+        bodies = None
+    else:
+        bodies = build_description_bodies(df, config).to_dict()
+
+    # Rows are read as plain tuples; resolve the positions of the mapped columns once
+    columns = list(df.columns)
+    pos_model = columns.index(col_model)
+    pos_voltage = columns.index(col_voltage) if col_voltage else None
+
+    records = []
     errors = []
 
-    grouped = df.groupby(col_model)
-    for model, group in grouped:
-        valid_rows = []
-        for idx in range(len(group)):
-            row = group.iloc[idx]
-            part_number = str(row[col_sku]).strip()
-            price_raw = str(row[col_price]).strip()
-            # Skip any row with 'CF', '-', '', 'N/A', or '—' as price or part_number
-            if price_raw in ['—', '-', '', 'N/A', 'CF']:
-                list_price = 0.0
-            else:
-                try:
-                    list_price = float(price_raw)
-                except:
-                    list_price = 0.0
-
-            if part_number in ['—', '-', '', 'N/A', 'CF'] or not list_price:
-                continue
-            valid_rows.append(idx)
-        if not valid_rows:
-            continue
-
-        handle = sanitize_handle(model)
-        for i, row_idx in enumerate(valid_rows):
-            row = group.iloc[row_idx]
-            voltage = str(row[col_voltage]).strip() if col_voltage else ''
-            part_number = str(row[col_sku]).strip()
-
-            try:
-                list_price = float(row[col_price]) if pd.notna(row[col_price]) and str(row[col_price]).strip() else 0.0
-            except:
-                list_price = 0.0
-
-            try:
-                weight = float(str(row[col_weight]).replace(',', '').strip()) if pd.notna(row[col_weight]) else 0.0
-            except:
-                weight = 0.0
-
-            grams = safe_eval(config.get('grams_formula', 'round(weight * 453.592)'), {'weight': weight})
-            price = safe_eval(config.get('pricing_formula', 'list_price * 0.36 * 1.15'), {'list_price': list_price})
-            cost = safe_eval(config.get('cost_formula', 'list_price * 0.36'), {'list_price': list_price})
-
-            # --- Build unified context for all formulas ---
-            row_context = dict(row)
-
-            # --- # Adding dynamic Model field  ---
-            if config:
-                row_context.update({k: v for k, v in config.items()})
-            row_context['model'] = row.get('Model', '')
-
-            # Adding dynamic Title field 
-            if "title_formula" in config:
-                title = safe_eval(config["title_formula"], row_context)
-            else:
-                title = str(row.get('Model', ''))
-
-            row_context['title'] = title
-            row_context['price'] = price
-            row_context['grams'] = grams
-            row_context['cost'] = cost
-            row_context['voltage'] = voltage
-            row_context['description'] = ''  # Placeholder (will set real description next)
-
-            # --- Build Description using the unified context ---
-            description = generate_description(row_context, config.get('seo_description_formula'), config)
-            row_context['description'] = description  # Update with real description
-
-            # --- Build SEO fields using the same context ---
-            seo_title = safe_eval(config.get('seo_title_formula'), row_context)
-            seo_description = safe_eval(config.get('seo_description_formula'), row_context)
-
-            requires_shipping = 'FALSE' if weight > config.get('weight_threshold', 150) else 'TRUE'
-
-            #Set bool for Image Src, Image Position, and Image Alt Text, Variant Image
-            is_single_product = not config.get('variant_option_fields')
-
-            row_dict = {
-                'Handle': handle,
-                'Title': title,
-                'Body (HTML)': description if mode == 'full' else '',
-                'Vendor': config['vendor'],
-                'Type': config['product_type'],
-                'Published': 'FALSE',
-                'Option1 Name': '',
-                'Option1 Value': '',
-                'Option2 Name': '',
-                'Option2 Value': '',
-                'Option3 Name': '',
-                'Option3 Value': '',
-                'Variant SKU': part_number,
-                'Variant Grams': grams,
-                'Variant Inventory Tracker': '',
-                'Variant Inventory Qty': '',
-                'Variant Inventory Policy': 'continue',
-                'Variant Fulfillment Service': 'manual',
-                'Variant Price': price,
-                'Variant Compare At Price': list_price,
-                'Variant Requires Shipping': requires_shipping,
-                'Variant Taxable': 'TRUE',
-                'Variant Barcode': '',
-                'Product Category': config.get('product_category', ''),
-                'Image Src': config['image_url'] if is_single_product or i == 0 else '',
-                'Image Position': 1 if is_single_product or i == 0 else '',
-                'Image Alt Text': title if is_single_product or i == 0 else '',
-                'SEO Title': seo_title,
-                'SEO Description': seo_description,
-                'Google Shopping / Gender': '',
-                'Google Shopping / Age Group': '',
-                'Google Shopping / AdWords Grouping': '',
-                'Google Shopping / AdWords Labels': '',
-                'Google Shopping / Custom Label 0': '',
-                'Google Shopping / Custom Label 1': '',
-                'Google Shopping / Custom Label 2': '',
-                'Google Shopping / Custom Label 3': '',
-                'Google Shopping / Custom Label 4': '',
-                'Variant Weight Unit': 'lb',
-                'Variant Tax Code': '',
-                'Cost per item': cost,
-                'Price / International': '',
-                'Compare At Price / International': '',
-                'Status': 'draft'
-            }
-
-            # Adding Variant Image logic
-            if is_single_product:
-                row_dict['Variant Image'] = ''
-            else:
-                row_dict['Variant Image'] = config['image_url'] if i == 0 else ''
-
-            # Adding Dynamic Tag logic
-            tags_formula = config.get("tags_formula")
-            if tags_formula:
-                tags = eval(tags_formula, {}, row_context)
-            else:
-                tags = f"{config['vendor']}, {config['collection']}"
-            row_dict['Tags'] = tags
-
-            if mode == 'description-only':
-                row_dict = {
-                    'Handle': handle,
-                    'Body (HTML)': description
-                }
-
-            # --- DYNAMIC PER-PRODUCT VARIANT LOGIC ---
-            ALL_OPTION_FIELDS = config.get('variant_option_fields')
-            if ALL_OPTION_FIELDS is None:
-                raise Exception("You must specify 'variant_option_fields' in your formulas.json config! (No default used)")
-            # Detect which options are usable for this product (group)
-            valid_option_fields = []
-            for field in ALL_OPTION_FIELDS:
-                vals = group[field].dropna().astype(str).str.upper()
-                vals = vals[~vals.isin(['', 'CF', 'N/A', '—', '-'])]
-                if not vals.empty and vals.nunique() > 1:
-                    valid_option_fields.append(field)
-            # Assign Option1/2/3 Name/Value dynamically for each row
-            option_names = []
-            option_values = []
-            for i in range(3):
-                if i < len(valid_option_fields):
-                    field = valid_option_fields[i]
-                    val = row.get(field, '')
-                    if clean_option(val):
-                        val = ''
-                    option_names.append(field)
-                    option_values.append(val)
-                else:
-                    option_names.append('')
-                    option_values.append('')
-            for idx in range(3):
-                row_dict[f'Option{idx+1} Name'] = option_names[idx]
-                row_dict[f'Option{idx+1} Value'] = option_values[idx]
-            # --- END DYNAMIC LOGIC ---
-
-            # Using SKU Logic
-            sku = row.get('Article Number', '')
-            if pd.isnull(sku) or str(sku).strip().upper() in ("", "CF", "N/A", "—", "-"):
-                sku = generate_shopify_sku(row, config)
-            row_dict['Variant SKU'] = sku if sku else ""
-            # Add to rows
-            rows.append(row_dict)
-
-
-    if not rows:
+    # Drop rows without a usable SKU or price in one pass, then order the rest by product:
+    # products in groupby order, rows in sheet order within each, rows without a model dropped
+    price_raw, list_price = parse_list_prices(df[col_price])
+    valid = valid_row_mask(df[col_sku], price_raw, list_price)
+    grouped = df[valid].groupby(col_model)
+    order = grouped.ngroup().dropna().sort_values(kind='stable').index
+    products = df.loc[order]
+    positions = grouped.cumcount().loc[order].astype(int).tolist()
+    if not positions:
         raise Exception("No valid rows to export.")
 
+    # Numeric fields for all valid rows at once; each formula is compiled once per file
+    numeric = pd.DataFrame({
+        'list_price': list_price.fillna(0.0).astype(float),
+        'weight': df[col_weight].map(parse_weight).astype(float).fillna(0.0)
+        if col_weight and not digital else 0.0,
+    }, index=df.index)[valid]
+    list_prices = numeric['list_price'].to_dict()
+    if not digital:
+        # Digital products never read weight or grams_formula (see the row loop)
+        weights = numeric['weight'].to_dict()
+        grams_by_row = compile_formula(config.get('grams_formula', 'round(weight * 453.592)'), ('weight',))(numeric).to_dict()
+    prices = compile_formula(config.get('pricing_formula', 'list_price * 0.36 * 1.15'), ('list_price',))(numeric).to_dict()
+    costs = compile_formula(config.get('cost_formula', 'list_price * 0.36'), ('list_price',))(numeric).to_dict()
+
+    # Which option fields vary within each product, computed for all products in one pass
+    ALL_OPTION_FIELDS = config.get('variant_option_fields')
+    if ALL_OPTION_FIELDS is None:
+        raise Exception("You must specify 'variant_option_fields' in your formulas.json config! (No default used)")
+    varying_models = {field: models_with_varying_option(df, col_model, field) for field in ALL_OPTION_FIELDS}
+    option_values = clean_option_values(products, ALL_OPTION_FIELDS)
+
+    # Per-file settings, looked up once instead of on every row
+    has_title_formula = "title_formula" in config
+    seo_title_formula = config.get('seo_title_formula')
+    seo_description_formula = config.get('seo_description_formula')
+    # generate_description already applied this formula; a pass-through would just copy the result
+    seo_reuses_description = _is_passthrough(seo_description_formula, 'description')
+    weight_threshold = config.get('weight_threshold', 150)
+    #Set bool for Image Src, Image Position, and Image Alt Text, Variant Image
+    is_single_product = not ALL_OPTION_FIELDS
+    image_url = config['image_url']
+    tags_formula = config.get("tags_formula")
+    default_tags = None if tags_formula else f"{config['vendor']}, {config['collection']}"
+
+    # row_context has the same keys for every row: alias them, and pick the description columns, once
+    context_keys = None
+    include_cols = None
+    for (label, *values), i in zip(products.itertuples(name=None), positions):
+        if i == 0:
+            # First row of a product: resolve its handle and which options are usable for it
+            model = values[pos_model]
+            handle = sanitize_handle(model)
+            valid_option_fields = [field for field in ALL_OPTION_FIELDS if model in varying_models[field]]
+        row = dict(zip(columns, values))
+        voltage = str(values[pos_voltage]).strip() if col_voltage else ''
+
+        list_price = list_prices[label]
+
+        if digital:
+            # Digital product: forcibly set weight and grams to 0
+            weight = 0.0
+            grams = 0
+        else:
+            weight = weights[label]
+            grams = grams_by_row[label]
+        price = prices[label]
+        cost = costs[label]
+
+        # --- Build unified context for all formulas ---
+        row_context = dict(row)
+
+        # --- # Adding dynamic Model field  ---
+        if config:
+            row_context.update(config)
+        row_context['model'] = row.get('Model', '')
+
+        # Adding dynamic Title field 
+        if has_title_formula:
+            title = safe_eval(config["title_formula"], row_context)
+        else:
+            title = str(row.get('Model', ''))
+
+        row_context['title'] = title
+        row_context['price'] = price
+        row_context['grams'] = grams
+        row_context['cost'] = cost
+        row_context['voltage'] = voltage
+        row_context['description'] = ''  # Placeholder (will set real description next)
+
+        # --- Build Description using the unified context ---
+        if context_keys is None:
+            context_keys = formula_context_keys(row_context)
+            if bodies is None:
+                include_cols = plan_description_columns(row_context, config)
+        description = generate_description(
+            row_context, seo_description_formula, config,
+            body=bodies[label] if bodies is not None else None, include_cols=include_cols,
+            context_keys=context_keys
+        )
+        row_context['description'] = description  # Update with real description
+
+        # --- Build SEO fields using the same context ---
+        seo_title = safe_eval(seo_title_formula, row_context)
+        if seo_reuses_description:
+            seo_description = description
+        else:
+            seo_description = safe_eval(seo_description_formula, row_context)
+
+        # Digital: Requires Shipping always FALSE
+        requires_shipping = 'FALSE' if digital or weight > weight_threshold else 'TRUE'
+
+        # Image columns are only filled on the first variant of a multi-variant product
+        show_image = is_single_product or i == 0
+
+        # Adding Dynamic Tag logic
+        tags = eval(tags_formula, {}, row_context) if tags_formula else default_tags
+
+        # --- DYNAMIC PER-PRODUCT VARIANT LOGIC ---
+        # Assign Option1/2/3 Name/Value dynamically for each row
+        options = []
+        for field in valid_option_fields[:3]:
+            options += [field, option_values[field][label]]
+        options += [''] * (6 - len(options))
+        # --- END DYNAMIC LOGIC ---
+
+        # Using SKU Logic
+        sku = row.get('Article Number', '')
+        if pd.isnull(sku) or str(sku).strip().upper() in _PLACEHOLDERS:
+            sku = generate_shopify_sku(row, config)
+
+        # One tuple per variant, in ROW_COLUMNS order
+        records.append((
+            handle, title, description, *options,
+            sku if sku else "", grams, price, list_price, requires_shipping,
+            image_url if show_image else '', 1 if show_image else '', title if show_image else '',
+            seo_title, seo_description, cost,
+            '' if is_single_product else (image_url if i == 0 else ''),
+            tags
+        ))
+
+
     ts = datetime.now().strftime("%Y%m%d_%H%M")
     outdir = "exports"
     os.makedirs(outdir, exist_ok=True)
@@ -346,9 +564,15 @@ def process_file(filepath, config, mode):
         else os.path.join(outdir, f"shopify_descriptions_{ts}.csv")
     
 
-    columns = SHOPIFY_HEADERS if mode == 'full' else ['Handle', 'Body (HTML)']
-    
-    pd.DataFrame(rows, columns=columns).to_csv(out_file, index=False)
+    # Assemble the frame column by column: per-variant values from the records, constants broadcast
+    out = dict(zip(ROW_COLUMNS, map(list, zip(*records))))
+    if mode == 'full':
+        out.update(static_columns(config))
+        columns = SHOPIFY_HEADERS
+    else:
+        columns = ['Handle', 'Body (HTML)']
+
+    pd.DataFrame(out, columns=columns).to_csv(out_file, index=False)
 
     if errors:
         error_log = os.path.join(outdir, f"errors_{ts}.log")
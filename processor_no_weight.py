@@ -1,353 +0,0 @@
-import os
-import pandas as pd
-import numpy as np
-from datetime import datetime
-from fuzzywuzzy import fuzz
-from description import generate_description
-
-SUPPORTED_EXT = ['.csv', '.xls', '.xlsx']
-
-SHOPIFY_HEADERS = [
-    'Handle', 'Title', 'Body (HTML)', 'Vendor', 'Type', 'Tags', 'Published',
-    'Option1 Name', 'Option1 Value', 'Option2 Name', 'Option2 Value', 'Option3 Name', 'Option3 Value',
-    'Variant SKU', 'Variant Grams', 'Variant Inventory Tracker', 'Variant Inventory Qty',
-    'Variant Inventory Policy', 'Variant Fulfillment Service', 'Variant Price', 'Variant Compare At Price',
-    'Variant Requires Shipping', 'Variant Taxable', 'Variant Barcode', 'Product Category',
-    'Image Src', 'Image Position', 'Image Alt Text', 'Gift Card', 'SEO Title', 'SEO Description',
-    'Google Shopping / Google Product Category', 'Google Shopping / Gender', 'Google Shopping / Age Group',
-    'Google Shopping / MPN', 'Google Shopping / AdWords Grouping', 'Google Shopping / AdWords Labels',
-    'Google Shopping / Condition', 'Google Shopping / Custom Product', 'Google Shopping / Custom Label 0',
-    'Google Shopping / Custom Label 1', 'Google Shopping / Custom Label 2', 'Google Shopping / Custom Label 3',
-    'Google Shopping / Custom Label 4', 'Variant Image', 'Variant Weight Unit', 'Variant Tax Code',
-    'Cost per item', 'Price / International', 'Compare At Price / International', 'Status'
-]
-
-def fuzzy_match_columns(df, config):
-    """
-    Map only the columns listed in config['required_columns'] and config['variant_option_fields'] (if any).
-    """
-    from fuzzywuzzy import fuzz
-    FUZZY_THRESHOLD = 70
-
-    # What do we need for this batch?
-    required = config.get("required_columns", [])
-    variant_fields = config.get("variant_option_fields", [])
-    fields_needed = list(set(required + variant_fields))
-
-    # Optionally, you can update DEFAULT_MAP to include aliases only for these fields
-    DEFAULT_ALIASES = {
-        'Model': ['Model'],
-        'Voltage': ['Voltage'],
-        'Power': ['Power HP', 'Individual Pump Power (HP)'],
-        'Weight lbs': ['Weight lbs', 'Weight'],
-        'List Price': ['List Price'],
-        'Article Number': ['Article Number', 'Part Number']
-        # ... add any other field-specific aliases
-    }
-
-    mapping = {}
-    for field in fields_needed:
-        aliases = DEFAULT_ALIASES.get(field, [field])
-        found = False
-        for alias in aliases:
-            for col in df.columns:
-                score = fuzz.token_set_ratio(col.lower(), alias.lower())
-                if score >= FUZZY_THRESHOLD:
-                    mapping[field] = col
-                    found = True
-                    break
-            if found:
-                break
-        if not found:
-            raise Exception(f"Missing required column: {field}")
-    return mapping
-
-
-def clean_option(val):
-    return (pd.isnull(val) or str(val).strip().upper() in ("", "CF", "N/A", "—", "-"))
-
-def generate_shopify_sku(row, config, option_fields_key="variant_option_fields"):
-    """
-    Build a globally unique SKU from product type, model, and all option values.
-    Cleans up spaces and punctuation for a Shopify-friendly SKU.
-
-    Args:
-        row (dict or pd.Series): The source row data.
-        config (dict): The current formulas/config, must include variant_option_fields.
-        option_fields_key (str): Key in config for option fields.
-
-    Returns:
-        str: Unique, uppercase SKU string.
-    """
-    def clean(val):
-        # Remove spaces, brackets, slashes, dashes, and make uppercase
-        return str(val).replace(' ', '').replace('(', '').replace(')', '').replace('&', '').replace('/', '').replace('-', '').upper()
-
-    sku_parts = []
-
-    # 1. Product Type
-    prod_type = row.get('Type', '')
-    if pd.notnull(prod_type) and str(prod_type).strip():
-        sku_parts.append(clean(prod_type))
-
-    # 2. Model
-    model = row.get('Model', '')
-    if pd.notnull(model) and str(model).strip():
-        sku_parts.append(clean(model))
-
-    # 3. Variant options (from config)
-    option_fields = config.get(option_fields_key, [])
-    for field in option_fields:
-        val = row.get(field, "")
-        if pd.notnull(val) and str(val).strip().upper() not in ("", "CF", "N/A", "—", "-"):
-            sku_parts.append(clean(val))
-
-    # 4. Join for final SKU
-    return "-".join(sku_parts)
-
-def safe_eval(expr, context):
-    import ast
-    try:
-        tree = ast.parse(expr, mode='eval')
-        allowed = (
-            ast.Expression, ast.BinOp, ast.Num, ast.Name, ast.Load, ast.UnaryOp,
-            ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub,
-            ast.Call, ast.FormattedValue, ast.JoinedStr, ast.Constant
-        )
-        for node in ast.walk(tree):
-            if not isinstance(node, allowed):
-                raise ValueError(f"Unsafe expression: {expr} [blocked {type(node).__name__}]")
-        return eval(compile(tree, "<string>", "eval"), {}, context)
-    except Exception as e:
-        raise ValueError(f"Invalid formula: {e}")
-
-
-def sanitize_handle(name):
-    return name.strip().lower().replace(' ', '-').replace('/', '-').replace('(', '').replace(')', '')
-
-def process_file(filepath, config, mode):
-    ext = os.path.splitext(filepath)[1].lower()
-    if ext not in SUPPORTED_EXT:
-        raise Exception("Unsupported file format.")
-
-    df = pd.read_excel(filepath) if ext in ['.xls', '.xlsx'] else pd.read_csv(filepath)
-    if len(df) > 1500:
-        print("Warning: File has more than 1500 rows.")
-
-    column_map = fuzzy_match_columns(df, config)
-    df = df.rename(columns=column_map)
-
-    col_model = column_map['Model']
-    # col_voltage = column_map['Voltage']
-    # col_power = column_map['Power']
-    # col_weight = column_map['Weight']
-    col_price = column_map['List Price']
-    col_sku = column_map['Article Number']
-
-    col_voltage = column_map.get('Voltage')
-    col_power = column_map.get('Power')
-    col_weight = column_map.get('Weight lbs')
-
-    rows = []
-    errors = []
-
-    grouped = df.groupby(col_model)
-    for model, group in grouped:
-        valid_rows = []
-        for idx in range(len(group)):
-            row = group.iloc[idx]
-            part_number = str(row[col_sku]).strip()
-            price_raw = str(row[col_price]).strip()
-            # Skip any row with 'CF', '-', '', 'N/A', or '—' as price or part_number
-            if price_raw in ['—', '-', '', 'N/A', 'CF']:
-                list_price = 0.0
-            else:
-                try:
-                    list_price = float(price_raw)
-                except:
-                    list_price = 0.0
-
-            if part_number in ['—', '-', '', 'N/A', 'CF'] or not list_price:
-                continue
-            valid_rows.append(idx)
-        if not valid_rows:
-            continue
-
-        handle = sanitize_handle(model)
-        for i, row_idx in enumerate(valid_rows):
-            row = group.iloc[row_idx]
-            voltage = str(row[col_voltage]).strip() if col_voltage else ''
-            part_number = str(row[col_sku]).strip()
-            # Digital product: forcibly set weight and grams to 0
-            weight = 0.0
-            grams = 0
-            try:
-                list_price = float(row[col_price]) if pd.notna(row[col_price]) and str(row[col_price]).strip() else 0.0
-            except:
-                list_price = 0.0
-
-            price = safe_eval(config.get('pricing_formula', 'list_price * 0.36 * 1.15'), {'list_price': list_price})
-            cost = safe_eval(config.get('cost_formula', 'list_price * 0.36'), {'list_price': list_price})
-
-            # --- Build unified context for all formulas ---
-            row_context = dict(row)
-
-            # --- # Adding dynamic Model field  ---
-            if config:
-                row_context.update({k: v for k, v in config.items()})
-            row_context['model'] = row.get('Model', '')
-
-            # Adding dynamic Title field 
-            if "title_formula" in config:
-                title = safe_eval(config["title_formula"], row_context)
-            else:
-                title = str(row.get('Model', ''))
-
-            row_context['title'] = title
-            row_context['price'] = price
-            row_context['grams'] = grams
-            row_context['cost'] = cost
-            row_context['voltage'] = voltage
-            row_context['description'] = ''  # Placeholder (will set real description next)
-
-
-                # --- Generate description and update context ---
-            description = generate_description(row_context, config.get('seo_description_formula'), config)
-            row_context['description'] = description
-
-            # --- SEO fields use same context ---
-            seo_title = safe_eval(config.get('seo_title_formula'), row_context)
-            seo_description = safe_eval(config.get('seo_description_formula'), row_context)
-
-            # Digital: Requires Shipping always FALSE
-            requires_shipping = 'FALSE'
-
-            #Set bool for Image Src, Image Position, and Image Alt Text, Variant Image
-            is_single_product = not config.get('variant_option_fields')
-
-            row_dict = {
-                'Handle': handle,
-                'Title': title,
-                'Body (HTML)': description if mode == 'full' else '',
-                'Vendor': config['vendor'],
-                'Type': config['product_type'],
-                'Published': 'FALSE',
-                'Option1 Name': '',
-                'Option1 Value': '',
-                'Option2 Name': '',
-                'Option2 Value': '',
-                'Option3 Name': '',
-                'Option3 Value': '',
-                'Variant SKU': part_number,
-                'Variant Grams': grams,
-                'Variant Inventory Tracker': '',
-                'Variant Inventory Qty': '',
-                'Variant Inventory Policy': 'continue',
-                'Variant Fulfillment Service': 'manual',
-                'Variant Price': price,
-                'Variant Compare At Price': list_price,
-                'Variant Requires Shipping': requires_shipping,
-                'Variant Taxable': 'TRUE',
-                'Variant Barcode': '',
-                'Product Category': config.get('product_category', ''),
-                'Image Src': config['image_url'] if is_single_product or i == 0 else '',
-                'Image Position': 1 if is_single_product or i == 0 else '',
-                'Image Alt Text': title if is_single_product or i == 0 else '',
-                'SEO Title': seo_title,
-                'SEO Description': seo_description,
-                'Google Shopping / Gender': '',
-                'Google Shopping / Age Group': '',
-                'Google Shopping / AdWords Grouping': '',
-                'Google Shopping / AdWords Labels': '',
-                'Google Shopping / Custom Label 0': '',
-                'Google Shopping / Custom Label 1': '',
-                'Google Shopping / Custom Label 2': '',
-                'Google Shopping / Custom Label 3': '',
-                'Google Shopping / Custom Label 4': '',
-                'Variant Weight Unit': 'lb',
-                'Variant Tax Code': '',
-                'Cost per item': cost,
-                'Price / International': '',
-                'Compare At Price / International': '',
-                'Status': 'draft'
-            }
-
-            # Adding Variant Image logic
-            if is_single_product:
-                row_dict['Variant Image'] = ''
-            else:
-                row_dict['Variant Image'] = config['image_url'] if i == 0 else ''
-
-            # Adding Dynamic Tag logic
-            tags_formula = config.get("tags_formula")
-            if tags_formula:
-                tags = eval(tags_formula, {}, row_context)
-            else:
-                tags = f"{config['vendor']}, {config['collection']}"
-            row_dict['Tags'] = tags
-
-            if mode == 'description-only':
-                row_dict = {
-                    'Handle': handle,
-                    'Body (HTML)': description
-                }
-
-            # --- DYNAMIC PER-PRODUCT VARIANT LOGIC ---
-            ALL_OPTION_FIELDS = config.get('variant_option_fields')
-            if ALL_OPTION_FIELDS is None:
-                raise Exception("You must specify 'variant_option_fields' in your formulas.json config! (No default used)")
-            # Detect which options are usable for this product (group)
-            valid_option_fields = []
-            for field in ALL_OPTION_FIELDS:
-                vals = group[field].dropna().astype(str).str.upper()
-                vals = vals[~vals.isin(['', 'CF', 'N/A', '—', '-'])]
-                if not vals.empty and vals.nunique() > 1:
-                    valid_option_fields.append(field)
-            # Assign Option1/2/3 Name/Value dynamically for each row
-            option_names = []
-            option_values = []
-            for i in range(3):
-                if i < len(valid_option_fields):
-                    field = valid_option_fields[i]
-                    val = row.get(field, '')
-                    if clean_option(val):
-                        val = ''
-                    option_names.append(field)
-                    option_values.append(val)
-                else:
-                    option_names.append('')
-                    option_values.append('')
-            for idx in range(3):
-                row_dict[f'Option{idx+1} Name'] = option_names[idx]
-                row_dict[f'Option{idx+1} Value'] = option_values[idx]
-            # --- END DYNAMIC LOGIC ---
-
-            # Using SKU Logic
-            sku = row.get('Article Number', '')
-            if pd.isnull(sku) or str(sku).strip().upper() in ("", "CF", "N/A", "—", "-"):
-                sku = generate_shopify_sku(row, config)
-            row_dict['Variant SKU'] = sku if sku else ""
-            # Add to rows
-            rows.append(row_dict)
-
-    if not rows:
-        raise Exception("No valid rows to export.")
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M")
-    outdir = "exports"
-    os.makedirs(outdir, exist_ok=True)
-
-    out_file = os.path.join(outdir, f"shopify_import_{ts}.csv") if mode == 'full' \
-        else os.path.join(outdir, f"shopify_descriptions_{ts}.csv")
-
-    columns = SHOPIFY_HEADERS if mode == 'full' else ['Handle', 'Body (HTML)']
-    pd.DataFrame(rows, columns=columns).to_csv(out_file, index=False)
-
-    if errors:
-        error_log = os.path.join(outdir, f"errors_{ts}.log")
-        with open(error_log, 'w') as f:
-            for e in errors:
-                f.write(e + '\n')
-        print(f"⚠️ Validation errors logged to {error_log}")
-
-    return out_file